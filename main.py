@@ -4,14 +4,26 @@
 # Script pequeño para armar una BD SQLite de juguete y correr algunas consultas.
 # Mantener simple > sobre-ingeniería. Si algo crece, separar en módulos.
 
+from __future__ import annotations
+
 import argparse
+import hashlib
+import json
 import sqlite3
-from datetime import datetime, timedelta
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+
+# pandas y matplotlib se importan dentro de las funciones que los usan:
+# --init-db / --seed no los necesitan y son lo más caro de cargar.
+if TYPE_CHECKING:
+    import pandas as pd
 
 # ---------------------------------------------------------------------
 # utilidades
@@ -22,11 +34,37 @@ def mkparent(path: Path) -> None:
 
 
 def connect(db_path: str) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
+    # cached_statements: el módulo sqlite3 reutiliza sentencias ya preparadas
+    # si el texto SQL es idéntico (default 128; las consultas demo caben de sobra).
+    # isolation_level=None: sin BEGIN implícitos del módulo; las transacciones
+    # se abren a mano con transaction() y el resto queda en autocommit.
+    conn = sqlite3.connect(db_path, cached_statements=256, isolation_level=None)
+    conn.text_factory = str
     conn.execute("PRAGMA foreign_keys = ON;")
+    # Ajustes para carga masiva: WAL + fsync relajado. WAL queda persistido
+    # en el archivo, así que re-ejecutarlo es barato.
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute("PRAGMA cache_size = -65536;")  # ~64 MiB
     return conn
 
 
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    # BEGIN/COMMIT explícitos; si algo revienta adentro, ROLLBACK y se relanza.
+    conn.execute("BEGIN;")
+    try:
+        yield conn
+    except BaseException:
+        # SQLite pudo haber revertido solo (SQLITE_FULL, interrupt...); un
+        # ROLLBACK sin transacción activa taparía la excepción original.
+        if conn.in_transaction:
+            conn.execute("ROLLBACK;")
+        raise
+    conn.execute("COMMIT;")
+
+
 # ---------------------------------------------------------------------
 # esquema
 # ---------------------------------------------------------------------
@@ -41,18 +79,34 @@ CREATE TABLE IF NOT EXISTS customers (
     signup_date TEXT NOT NULL
 );
 
+-- Tablas de lookup: orders guarda sólo el id (entero) en vez del texto
+CREATE TABLE IF NOT EXISTS categories (
+    category_id INTEGER PRIMARY KEY,
+    name        TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS statuses (
+    status_id   INTEGER PRIMARY KEY,
+    name        TEXT UNIQUE NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS orders (
     order_id    INTEGER PRIMARY KEY,
     customer_id INTEGER NOT NULL,
     order_date  TEXT NOT NULL,
-    category    TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
     amount      REAL NOT NULL,
-    status      TEXT NOT NULL CHECK(status IN ('PAID','CANCELLED','REFUNDED')),
-    FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+    status_id   INTEGER NOT NULL,
+    -- 'YYYY-MM' derivado de order_date (columna generada, SQLite 3.31+)
+    order_ym    TEXT GENERATED ALWAYS AS (substr(order_date, 1, 7)) VIRTUAL,
+    FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
+    FOREIGN KEY (category_id) REFERENCES categories(category_id),
+    FOREIGN KEY (status_id)   REFERENCES statuses(status_id)
 );
 """
 
 CITIES = ["Santiago", "Valparaíso", "Viña del Mar", "Concepción", "La Serena", "Antofagasta"]
+# El id en la BD es la posición en la lista + 1 (ver create_schema).
 CATEGORIES = ["Electronics", "Groceries", "Books", "Home", "Sports", "Beauty"]
 STATUSES = ["PAID", "CANCELLED", "REFUNDED"]
 
@@ -61,65 +115,101 @@ rng = np.random.default_rng(2025)
 
 
 def create_schema(conn: sqlite3.Connection) -> None:
-    with conn:
-        conn.executescript(SCHEMA)
+    # executescript maneja su propio commit; todo es IF NOT EXISTS igual.
+    conn.executescript(SCHEMA)
+    with transaction(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO categories(category_id,name) VALUES (?,?)",
+            enumerate(CATEGORIES, start=1),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO statuses(status_id,name) VALUES (?,?)",
+            enumerate(STATUSES, start=1),
+        )
 
 
 # ---------------------------------------------------------------------
 # datos sintéticos
 # ---------------------------------------------------------------------
 
-def make_customers(n: int = 300) -> list[tuple]:
+def make_customers(n: int = 300, offset: int = 0) -> list[tuple]:
     first = rng.choice(["Ana","Luis","Camila","Diego","Matías","Carla","Javiera","Pedro"], size=n)
     last  = rng.choice(["Pérez","González","Soto","Muñoz","Rojas","Silva","López"], size=n)
     city  = rng.choice(CITIES, size=n, p=[0.45,0.12,0.12,0.15,0.08,0.08])
     # Fechas de alta distribuidas en ~600 días
-    base = datetime(2023, 1, 1)
-    signup = [ (base + timedelta(days=int(x))).strftime("%Y-%m-%d") for x in rng.integers(0, 600, size=n) ]
-    rows = []
-    for i in range(n):
-        rows.append((first[i], last[i], f"user{i}@example.com", city[i], signup[i]))
-    return rows
+    days = rng.integers(0, 600, size=n)
+    signup = (np.datetime64("2023-01-01") + days.astype("timedelta64[D]")).astype("U10")
+    ids = np.arange(offset, offset + n).astype(str)
+    emails = np.char.add(np.char.add("user", ids), "@example.com")
+    return list(zip(first.tolist(), last.tolist(), emails.tolist(), city.tolist(), signup.tolist()))
 
 
-def make_orders(n: int, n_customers: int) -> list[tuple]:
-    start = datetime(2023, 6, 1)
+def make_orders(n: int, n_customers: int) -> dict[str, np.ndarray]:
+    # Columnar (un arreglo por columna); las tuplas se arman recién al
+    # momento de insertar, ver load_orders.
     days = rng.integers(0, 480, size=n)
-    dates = [ (start + timedelta(days=int(d))).strftime("%Y-%m-%d") for d in days ]
+    dates = (np.datetime64("2023-06-01") + days.astype("timedelta64[D]")).astype("U10")
 
     # Montos con cola pesada (lognormal) y mínimo positivo
     amounts = np.round(rng.lognormal(mean=3.2, sigma=0.65, size=n), 2)
 
-    rows = []
-    for i in range(n):
-        rows.append((
-            int(rng.integers(1, n_customers + 1)),
-            dates[i],
-            str(rng.choice(CATEGORIES, p=[0.25,0.20,0.13,0.18,0.14,0.10])),
-            float(amounts[i]),
-            str(rng.choice(STATUSES, p=[0.85,0.10,0.05]))
-        ))
-    return rows
+    # Todo se sortea de una vez (vectorizado), nada de rng dentro de un loop
+    cust_ids = rng.integers(1, n_customers + 1, size=n)
+    # Categoría/estado como ids enteros de las tablas de lookup (posición + 1)
+    cat_ids = rng.choice(len(CATEGORIES), size=n, p=[0.25,0.20,0.13,0.18,0.14,0.10]) + 1
+    st_ids = rng.choice(len(STATUSES), size=n, p=[0.85,0.10,0.05]) + 1
+    return {
+        "customer_id": cust_ids,
+        "order_date": dates,
+        "category_id": cat_ids,
+        "amount": amounts,
+        "status_id": st_ids,
+    }
 
 
-# ---------------------------------------------------------------------
-# carga a SQLite (sin pandas, a propósito)
-# ---------------------------------------------------------------------
+# Versiones "streaming": generan por bloques, así executemany consume las
+# filas sin tener nunca el dataset completo en memoria.
 
-def load_customers(conn: sqlite3.Connection, rows: list[tuple]) -> None:
-    with conn:
-        conn.executemany(
-            "INSERT INTO customers(first_name,last_name,email,city,signup_date) VALUES (?,?,?,?,?)",
-            rows,
-        )
+def iter_customers(n: int, chunk: int = 10_000) -> Iterator[tuple]:
+    for offset in range(0, n, chunk):
+        yield from make_customers(min(chunk, n - offset), offset=offset)
 
 
-def load_orders(conn: sqlite3.Connection, rows: list[tuple]) -> None:
-    with conn:
-        conn.executemany(
-            "INSERT INTO orders(customer_id,order_date,category,amount,status) VALUES (?,?,?,?,?)",
-            rows,
+def iter_orders(n: int, n_customers: int, chunk: int = 10_000) -> Iterator[dict[str, np.ndarray]]:
+    for offset in range(0, n, chunk):
+        yield make_orders(min(chunk, n - offset), n_customers)
+
+
+# ---------------------------------------------------------------------
+# carga a SQLite (sin pandas, a propósito)
+# ---------------------------------------------------------------------
+# Ojo: estas funciones NO abren transacción propia; el que llama decide
+# (ver seed_db, que mete todo en un solo BEGIN/COMMIT).
+
+def load_customers(conn: sqlite3.Connection, rows: Iterable[tuple]) -> None:
+    conn.executemany(
+        "INSERT INTO customers(first_name,last_name,email,city,signup_date) VALUES (?,?,?,?,?)",
+        rows,
+    )
+
+
+def load_orders(conn: sqlite3.Connection, chunks: Iterable[dict[str, np.ndarray]]) -> None:
+    # Cada bloque llega por columnas; zip arma las tuplas justo al bindear.
+    rows = (
+        row
+        for d in chunks
+        for row in zip(
+            d["customer_id"].tolist(),
+            d["order_date"].tolist(),
+            d["category_id"].tolist(),
+            d["amount"].tolist(),
+            d["status_id"].tolist(),
         )
+    )
+    conn.executemany(
+        "INSERT INTO orders(customer_id,order_date,category_id,amount,status_id) VALUES (?,?,?,?,?)",
+        rows,
+    )
 
 
 # ---------------------------------------------------------------------
@@ -131,75 +221,180 @@ SQL = {
         SELECT c.customer_id,
                c.first_name || ' ' || c.last_name AS customer,
                c.city,
-               SUM(CASE WHEN o.status='PAID' THEN o.amount ELSE 0 END) AS revenue
-        FROM customers c
-        JOIN orders o ON o.customer_id = c.customer_id
-        GROUP BY c.customer_id, customer, c.city
-        HAVING revenue > 0
-        ORDER BY revenue DESC
+               r.revenue
+        FROM rev_by_cust r
+        JOIN customers c ON c.customer_id = r.customer_id
+        ORDER BY r.revenue DESC
         LIMIT 10;
     """,
     "monthly_revenue": """
-        SELECT strftime('%Y-%m', o.order_date) AS ym,
-               SUM(CASE WHEN status='PAID' THEN amount ELSE 0 END) AS revenue
+        SELECT o.order_ym AS ym,
+               SUM(o.amount) AS revenue
         FROM orders o
-        GROUP BY ym
-        ORDER BY ym;
+        WHERE o.status_id = (SELECT status_id FROM statuses WHERE name = 'PAID')
+        GROUP BY o.order_ym
+        ORDER BY o.order_ym;
     """,
     "category_city_matrix": """
-        SELECT c.city, o.category,
-               SUM(CASE WHEN o.status='PAID' THEN o.amount ELSE 0 END) AS revenue
+        SELECT c.city, k.name AS category,
+               SUM(o.amount) AS revenue
         FROM customers c
         JOIN orders o ON o.customer_id = c.customer_id
-        GROUP BY c.city, o.category
-        ORDER BY c.city, o.category;
+        JOIN categories k ON k.category_id = o.category_id
+        WHERE o.status_id = (SELECT status_id FROM statuses WHERE name = 'PAID')
+        GROUP BY c.city, k.name
+        ORDER BY c.city, k.name;
     """,
     # Nota: ventana simple para un ranking interno por ciudad.
     "window_rank_in_city": """
         SELECT city, customer, revenue, rn FROM (
           SELECT c.city AS city,
                  c.first_name || ' ' || c.last_name AS customer,
-                 SUM(CASE WHEN o.status='PAID' THEN o.amount ELSE 0 END) AS revenue,
-                 ROW_NUMBER() OVER (PARTITION BY c.city ORDER BY SUM(CASE WHEN o.status='PAID' THEN o.amount ELSE 0 END) DESC) AS rn
-          FROM customers c
-          JOIN orders o ON o.customer_id = c.customer_id
-          GROUP BY c.city, c.customer_id
+                 r.revenue AS revenue,
+                 ROW_NUMBER() OVER (PARTITION BY c.city ORDER BY r.revenue DESC) AS rn
+          FROM rev_by_cust r
+          JOIN customers c ON c.customer_id = r.customer_id
         ) t
         WHERE rn <= 3
         ORDER BY city, rn;
     """,
 }
 
+# Revenue PAID por cliente: lo usan top_customers y window_rank_in_city, así
+# que se agrega una sola vez. Es tabla normal (no TEMP) porque las consultas
+# corren en conexiones de sólo lectura aparte; --demo la recrea cada vez.
+REV_BY_CUST = [
+    "DROP TABLE IF EXISTS rev_by_cust;",
+    """
+    CREATE TABLE rev_by_cust AS
+    SELECT customer_id, SUM(amount) AS revenue
+    FROM orders
+    WHERE status_id = (SELECT status_id FROM statuses WHERE name = 'PAID')
+    GROUP BY customer_id;
+    """,
+    "CREATE INDEX idx_rev_by_cust_customer ON rev_by_cust(customer_id);",
+]
+
+# Índices pensados para las consultas demo: (status_id, ...) primero porque
+# todas filtran por PAID, y amount al final para no ir a la tabla por el monto.
+# idx_orders_customer se mantiene aparte: los compuestos empiezan por
+# status_id y no sirven para buscar sólo por customer_id (ni para el chequeo
+# de la FK al borrar/actualizar un cliente). Los índices sueltos de order_date
+# y status_id ya no los usa ninguna consulta (status_id es prefijo de los
+# compuestos), así que se eliminan también en BDs existentes.
 INDEXES = [
+    "DROP INDEX IF EXISTS idx_orders_date;",
+    "DROP INDEX IF EXISTS idx_orders_status;",
+    "DROP INDEX IF EXISTS idx_orders_date_status_amt;",
     "CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id);",
-    "CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(order_date);",
-    "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);",
+    "CREATE INDEX IF NOT EXISTS idx_orders_status_cust_amt ON orders(status_id, customer_id, amount);",
+    "CREATE INDEX IF NOT EXISTS idx_orders_status_ym_amt ON orders(status_id, order_ym, amount);",
 ]
 
 
-def explain_plan(conn: sqlite3.Connection, sql: str) -> str:
-    cur = conn.execute("EXPLAIN QUERY PLAN " + sql)
-    # EXPLAIN devuelve 4 columnas; nos interesa la última (detalle)
-    lines = [row[-1] for row in cur.fetchall()]
-    return "\n".join(lines)
+PREVIEW_ROWS = 10
+
+
+def fetch_rows(conn: sqlite3.Connection, sql: str, limit: int | None = None) -> tuple[list[str], list[tuple]]:
+    # conn.execute con el mismo texto -> SQLite reutiliza la sentencia ya
+    # preparada (cached_statements en connect). Sin pandas de por medio.
+    # Con limit sólo se leen esas filas del cursor; el resto ni se materializa.
+    cur = conn.execute(sql)
+    cols = [d[0] for d in cur.description]
+    return cols, list(islice(cur, limit))
+
+
+def _run_one(db_path: str, sql: str, limit: int | None = None) -> tuple[list[str], list[tuple]]:
+    # Cada hilo abre su propia conexión de sólo lectura (WAL permite varios
+    # lectores a la vez); sqlite3 suelta el GIL mientras SQLite trabaja.
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        return fetch_rows(conn, sql, limit)
+    finally:
+        conn.close()
+
+
+def _to_frame(cols: list[str], rows: list[tuple]) -> pd.DataFrame:
+    # Para resultados chicos (las consultas demo) from_records es lo más
+    # directo; para algo grande, mejor pd.read_sql_query.
+    import pandas as pd
+
+    return pd.DataFrame.from_records(rows, columns=cols)
+
 
+def _print_rows(cols: list[str], rows: list[tuple]) -> None:
+    # Mismo aspecto que print(DataFrame) (índice + columnas alineadas a la
+    # derecha, floats a 2 decimales) pero sin importar pandas.
+    cells = [[f"{v:.2f}" if isinstance(v, float) else str(v) for v in row] for row in rows]
+    index = [str(i) for i in range(len(rows))]
+    iw = max((len(i) for i in index), default=0)
+    widths = [max([len(c), *(len(r[j]) for r in cells)]) for j, c in enumerate(cols)]
+    print(" " * iw + "".join("  " + c.rjust(w) for c, w in zip(cols, widths)))
+    for i, r in zip(index, cells):
+        print(i.ljust(iw) + "".join("  " + v.rjust(w) for v, w in zip(r, widths)))
 
-def plot_monthly_revenue(df_monthly: pd.DataFrame, outpath: Path) -> None:
-    plt.figure()
-    plt.plot(df_monthly["ym"], df_monthly["revenue"], marker="o")
-    plt.title("Ingresos mensuales (status=PAID)")
-    plt.xlabel("Año-Mes")
-    plt.ylabel("Revenue")
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-    plt.savefig(outpath, dpi=160)
-    plt.close()
+
+# Planes ya calculados, por hash del SQL (normalizado). Se persiste en un
+# JSON al lado de query_plans.txt para no repetir EXPLAIN entre corridas.
+# El hash incluye también SCHEMA, INDEXES, REV_BY_CUST y la versión de SQLite:
+# si cambia cualquiera de ellos el plan (o cómo se escribe) puede cambiar
+# aunque el texto de la consulta sea el mismo.
+_PLAN_CACHE: dict[str, str] = {}
+
+
+def plan_key(sql: str) -> str:
+    context = "\n".join([sqlite3.sqlite_version, SCHEMA, *INDEXES, *REV_BY_CUST])
+    return hashlib.sha1((sql.strip() + "\n" + context).encode("utf-8")).hexdigest()
+
+
+def load_plan_cache(path: Path) -> dict[str, str]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return {}  # cache roto -> se recalcula todo
+
+
+def explain_plan(conn: sqlite3.Connection, sql: str) -> str:
+    key = plan_key(sql)
+    if key not in _PLAN_CACHE:
+        cur = conn.execute("EXPLAIN QUERY PLAN " + sql.strip())
+        # EXPLAIN devuelve 4 columnas; nos interesa la última (detalle)
+        lines = [row[-1] for row in cur.fetchall()]
+        _PLAN_CACHE[key] = "\n".join(lines)
+    return _PLAN_CACHE[key]
+
+
+def plot_monthly_revenue(rows: list[tuple], outpath: Path) -> None:
+    import matplotlib
+    matplotlib.use("Agg")  # sólo se guardan PNGs; sin backend GUI
+    import matplotlib.pyplot as plt
+
+    # Agg: dibujar paths largos en bloques (más barato con muchos puntos)
+    matplotlib.rcParams["agg.path.chunksize"] = 10000
+
+    # API orientada a objetos: no pasa por el estado global de pyplot
+    # rows = [(ym, revenue), ...] tal cual sale de monthly_revenue
+    ym = np.array([r[0] for r in rows])
+    revenue = np.array([r[1] for r in rows])
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.plot(ym, revenue, marker="o")
+    ax.set_title("Ingresos mensuales (status=PAID)")
+    ax.set_xlabel("Año-Mes")
+    ax.set_ylabel("Revenue")
+    ax.tick_params(axis="x", labelrotation=45)
+    plt.setp(ax.get_xticklabels(), ha="right")
+    fig.tight_layout()
+    fig.savefig(outpath, dpi=160, bbox_inches=None)  # bbox "tight" re-renderiza; basta tight_layout
+    plt.close(fig)
 
 
 def demo_tx_and_params(conn: sqlite3.Connection) -> None:
     print("\n[Transacciones] Ejemplo rápido")
     try:
-        with conn:
+        with transaction(conn):
             conn.execute(
                 "INSERT INTO customers(first_name,last_name,email,city,signup_date) VALUES (?,?,?,?,?)",
                 ("Temporal","Test","temporal@example.com","Santiago", datetime.now().strftime("%Y-%m-%d"))
@@ -237,36 +432,69 @@ def seed_db(db_path: str, n_customers: int, n_orders: int) -> None:
         if cur.fetchone()[0] > 0:
             print("[INFO] BD ya tenía datos; no se duplica.")
             return
-        load_customers(conn, make_customers(n_customers))
-        load_orders(conn, make_orders(n_orders, n_customers))
+        # Una sola transacción para ambas cargas -> un solo commit/fsync
+        with transaction(conn):
+            load_customers(conn, iter_customers(n_customers))
+            load_orders(conn, iter_orders(n_orders, n_customers))
     print(f"[OK] Cargados {n_customers} clientes y {n_orders} órdenes")
 
 
-def run_demo(db_path: str) -> None:
+def run_demo(db_path: str, plot: bool = True) -> None:
     outdir = Path(db_path).parent
     outdir.mkdir(parents=True, exist_ok=True)
     with connect(db_path) as conn:
-        with conn:
+        # Esto sí escribe en la BD (índices + recrear rev_by_cust), por eso
+        # --demo necesita permiso de escritura aunque las consultas en sí
+        # corran después en conexiones de sólo lectura.
+        with transaction(conn):
             for idx in INDEXES:
                 conn.execute(idx)
+            for stmt in REV_BY_CUST:
+                conn.execute(stmt)
+
+        qp = outdir / "query_plans.txt"
+        qp_cache = outdir / "query_plans.json"
+        saved = load_plan_cache(qp_cache)
+        _PLAN_CACHE.update(saved)
+
+        # Sólo monthly_revenue se usa entero (gráfico); del resto basta el
+        # vistazo, así que se leen PREVIEW_ROWS filas y listo.
+        full = {"monthly_revenue"} if plot else set()
+
+        # Consultas en paralelo (son independientes); EXPLAIN en serie
+        # mientras tanto, que es barato y casi siempre sale del cache de planes.
+        with ThreadPoolExecutor(max_workers=len(SQL)) as pool:
+            futures = {
+                name: pool.submit(_run_one, db_path, sql.strip(), None if name in full else PREVIEW_ROWS)
+                for name, sql in SQL.items()
+            }
+            plans = [f"-- {name} --\n" + explain_plan(conn, sql) + "\n" for name, sql in SQL.items()]
 
-        plans = []
         results = {}
-        for name, sql in SQL.items():
+        for name, fut in futures.items():
+            cols, rows = fut.result()
             print(f"\n[Query] {name}")
-            df = pd.read_sql_query(sql, conn)
-            print(df.head(10))  # vistazo rápido
-            results[name] = df
-            plans.append(f"-- {name} --\n" + explain_plan(conn, sql) + "\n")
-
-        # Guardar planes
-        qp = outdir / "query_plans.txt"
-        qp.write_text("\n".join(plans), encoding="utf-8")
-        print(f"[OK] Planes -> {qp}")
+            if plot:
+                print(_to_frame(cols, rows[:PREVIEW_ROWS]))  # vistazo rápido
+            else:
+                # Sin gráfico no se guarda ningún resultado: ni siquiera pandas
+                _print_rows(cols, rows[:PREVIEW_ROWS])
+            results[name] = rows
+
+        # Guardar planes (sólo si alguna consulta cambió). Al JSON van sólo
+        # las claves de las consultas actuales; las viejas se descartan.
+        current = {k: _PLAN_CACHE[k] for k in (plan_key(sql) for sql in SQL.values())}
+        if current != saved or not qp.exists():
+            qp.write_text("\n".join(plans), encoding="utf-8")
+            qp_cache.write_text(json.dumps(current, indent=2), encoding="utf-8")
+            print(f"[OK] Planes -> {qp}")
+        else:
+            print(f"[OK] Planes sin cambios -> {qp}")
 
         # Gráfico mensual
-        plot_monthly_revenue(results["monthly_revenue"], outdir / "monthly_revenue.png")
-        print(f"[OK] Gráfico -> {outdir / 'monthly_revenue.png'}")
+        if plot:
+            plot_monthly_revenue(results["monthly_revenue"], outdir / "monthly_revenue.png")
+            print(f"[OK] Gráfico -> {outdir / 'monthly_revenue.png'}")
 
         # Demo de transacciones/parametrizadas
         demo_tx_and_params(conn)
@@ -280,6 +508,7 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--n_customers", type=int, default=300, help="N clientes")
     p.add_argument("--n_orders", type=int, default=2000, help="N órdenes")
     p.add_argument("--demo", action="store_true", help="Ejecutar consultas demo")
+    p.add_argument("--no-plot", action="store_true", help="En --demo, no generar gráfico (ni DataFrames)")
     return p.parse_args()
 
 
@@ -290,7 +519,7 @@ def main() -> None:
     if args.seed:
         seed_db(args.db, args.n_customers, args.n_orders)
     if args.demo:
-        run_demo(args.db)
+        run_demo(args.db, plot=not args.no_plot)
     if not (args.init_db or args.seed or args.demo):
         print("Nada que hacer. Usa --init-db / --seed / --demo")
 